@@ -15,6 +15,11 @@ Methods:
         For other methods, the payload is sent as query parameters.
         Allows overriding timeout and adding custom headers.
 
+    send_prepared():
+        Sends a request for a loaded Mode using its precomputed headers and
+        json-vs-params choice, avoiding per-call dict merging. Accepts an
+        optional pre-serialized JSON body so the payload is encoded once.
+
     close():
         Closes the underlying httpx client.
 
@@ -33,11 +38,22 @@ from __future__ import annotations
 import httpx
 from typing import Any, Dict
 
+from .config import Mode
+
 
 class ApiClient:
     def __init__(self, timeout: int = 10):
         self._base_timeout = timeout
-        self._client = httpx.Client(timeout=timeout)
+        self._client = httpx.Client(
+            timeout=timeout,
+            http2=True,
+            limits=httpx.Limits(
+                max_keepalive_connections=32,
+                max_connections=64,
+                keepalive_expiry=110.0,
+            ),
+            headers={"Connection": "keep-alive"},
+        )
 
     def send(
         self,
@@ -47,6 +63,7 @@ class ApiClient:
         *,
         timeout: int | None = None,
         headers: Dict[str, str] | None = None,
+        content: bytes | None = None,
     ) -> httpx.Response:
         method = method.upper()
         hdrs = {"Content-Type": "application/json"}
@@ -58,11 +75,35 @@ class ApiClient:
             "headers": hdrs,
         }
         if method in {"POST", "PUT", "PATCH"}:
-            request_args["json"] = payload
+            if content is not None:
+                request_args["content"] = content
+            else:
+                request_args["json"] = payload
         else:
             request_args["params"] = payload
         return self._client.request(method, **request_args)
 
+    def send_prepared(
+        self,
+        mode: Mode,
+        payload: Dict[str, Any],
+        *,
+        content: bytes | None = None,
+    ) -> httpx.Response:
+        request_args = {
+            "url": mode.endpoint,
+            "timeout": mode.timeout or self._base_timeout,
+            "headers": mode._headers,
+        }
+        if mode._use_json:
+            if content is not None:
+                request_args["content"] = content
+            else:
+                request_args["json"] = payload
+        else:
+            request_args["params"] = payload
+        return self._client.request(mode.method, **request_args)
+
     def close(self):
         self._client.close()
 
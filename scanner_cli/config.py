@@ -3,13 +3,15 @@ This module provides configuration management for scanner modes.
 
 Classes:
     Mode: Represents a scanner mode configuration, including endpoint, method, triggers, and other options.
+    ModeIndex: Precomputed lookup structures (exact-trigger dict and prefix trie) over loaded modes.
 
 Functions:
-    load_modes(directory: Path) -> Dict[str, Mode]:
-        Loads mode configurations from YAML files in the specified directory.
+    load_modes(directory: Path) -> ModeIndex:
+        Loads mode configurations from YAML files in the specified directory and indexes them.
 
-    find_mode(modes: Dict[str, Mode], barcode: str) -> Optional[Mode]:
-        Finds and returns a Mode matching the given barcode, either by trigger or prefix.
+    match_barcode(index: ModeIndex, barcode: str) -> tuple[Optional[Mode], str, str]:
+        Matches a barcode against the index in one pass, returning the Mode,
+        the match kind ("trigger", "prefix", or ""), and the matched prefix.
 
 (c) Passlick Development 2025. All rights reserved.
 """
@@ -17,14 +19,23 @@ Functions:
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import List, Optional, Dict, Any
+import hashlib
+import os
+import pickle
 import yaml
 import sys
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
 
-@dataclass
+
+@dataclass(slots=True)
 class Mode:
     name: str
     endpoint: str
@@ -37,6 +48,13 @@ class Mode:
     header: Dict[str, str] | None = None
     eval_mathops: bool = True
     enable_trigger_req: bool = False
+    # Derived request template, filled in by __post_init__.
+    _headers: Dict[str, str] | None = None
+    _use_json: bool = True
+
+    def __post_init__(self):
+        self._headers = {"Content-Type": "application/json", **(self.header or {})}
+        self._use_json = self.method in {"POST", "PUT", "PATCH"}
 
     @staticmethod
     def from_dict(data: Dict[str, Any]) -> "Mode":
@@ -58,31 +76,164 @@ class Mode:
         )
 
 
-def load_modes(directory: Path) -> Dict[str, Mode]:
-    modes: Dict[str, Mode] = {}
-    for path in directory.glob("*.y*ml"):
-        try:
-            with path.open("r", encoding="utf-8") as f:
-                raw = yaml.safe_load(f) or {}
-        except yaml.YAMLError as e:
-            print(f"[LOAD MODES] Failed to parse {path}: {e}", file=sys.stderr)
-            continue
-        try:
-            mode = Mode.from_dict(raw)
-        except KeyError as ke:
-            print(f"[LOAD MODES] Missing key {ke} in {path}", file=sys.stderr)
+@dataclass
+class _TrieNode:
+    prefix: str = ""
+    children: Dict[str, "_TrieNode"] = field(default_factory=dict)
+    mode: Optional[Mode] = None
+
+
+def _trie_insert(root: _TrieNode, key: str, mode: Mode) -> None:
+    node = root
+    while True:
+        if not key:
+            if node.mode is None:
+                node.mode = mode
+            return
+        child = node.children.get(key[0])
+        if child is None:
+            node.children[key[0]] = _TrieNode(prefix=key, mode=mode)
+            return
+        existing = child.prefix
+        i = 0
+        limit = min(len(key), len(existing))
+        while i < limit and key[i] == existing[i]:
+            i += 1
+        if i == len(existing):
+            node = child
+            key = key[i:]
             continue
-        modes[mode.name] = mode
+        # Split the compressed edge at the divergence point.
+        split = _TrieNode(prefix=existing[:i], children={existing[i]: child})
+        child.prefix = existing[i:]
+        node.children[key[0]] = split
+        if i == len(key):
+            split.mode = mode
+        else:
+            split.children[key[i]] = _TrieNode(prefix=key[i:], mode=mode)
+        return
+
+
+def _trie_lookup(root: _TrieNode, barcode: str) -> tuple[Optional[Mode], str]:
+    node = root
+    pos = 0
+    best: Optional[Mode] = None
+    best_end = 0
+    while True:
+        if node.mode is not None:
+            best = node.mode
+            best_end = pos
+        if pos >= len(barcode):
+            break
+        child = node.children.get(barcode[pos])
+        if child is None or not barcode.startswith(child.prefix, pos):
+            break
+        pos += len(child.prefix)
+        node = child
+    return best, barcode[:best_end]
+
+
+@dataclass
+class ModeIndex:
+    modes: Dict[str, Mode]
+    trigger_index: Dict[str, Mode] = field(default_factory=dict)
+    prefix_root: _TrieNode = field(default_factory=_TrieNode)
+
+    @staticmethod
+    def from_modes(modes: Dict[str, Mode]) -> "ModeIndex":
+        index = ModeIndex(modes=modes)
+        for mode in modes.values():
+            for trig in mode.trigger or []:
+                index.trigger_index.setdefault(trig, mode)
+            for pref in mode.prefix_trigger or []:
+                _trie_insert(index.prefix_root, pref, mode)
+        return index
+
+
+_CACHE_NAME = ".modes.cache.pkl"
+# Bump whenever the pickled Mode layout changes so stale caches are discarded.
+_CACHE_VERSION = 3
+
+
+def _cache_key(entries: List[os.DirEntry]) -> str:
+    h = hashlib.blake2b(f"v{_CACHE_VERSION}\n".encode())
+    for entry in sorted(entries, key=lambda e: e.name):
+        st = entry.stat()
+        h.update(f"{entry.name}\0{st.st_mtime_ns}\0{st.st_size}\n".encode())
+    return h.hexdigest()
+
+
+def _load_cache(cache_path: Path, key: str) -> Optional[Dict[str, Mode]]:
+    try:
+        with cache_path.open("rb") as f:
+            # Validate the key header first: a stale pickle written with an
+            # older Mode layout must never be unpickled.
+            if f.readline().strip() != key.encode("ascii"):
+                return None
+            modes = pickle.load(f)
+    except Exception:
+        return None
+    if not isinstance(modes, dict):
+        return None
     return modes
 
 
-def find_mode(modes: Dict[str, Mode], barcode: str) -> Optional[Mode]:
-    for mode in modes.values():
-        if mode.trigger and barcode in mode.trigger:
-            return mode
-    for mode in modes.values():
-        if mode.prefix_trigger:
-            for pref in mode.prefix_trigger:
-                if barcode.startswith(pref):
-                    return mode
-    return None
+def _store_cache(cache_path: Path, key: str, modes: Dict[str, Mode]) -> None:
+    tmp_path = cache_path.with_suffix(".tmp")
+    try:
+        with tmp_path.open("wb") as f:
+            f.write(key.encode("ascii") + b"\n")
+            pickle.dump(modes, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
+
+
+def _parse_one(path: str) -> Optional[Mode]:
+    try:
+        with open(path, "rb") as f:
+            raw = yaml.load(f, Loader=SafeLoader) or {}
+    except yaml.YAMLError as e:
+        print(f"[LOAD MODES] Failed to parse {path}: {e}", file=sys.stderr)
+        return None
+    try:
+        return Mode.from_dict(raw)
+    except KeyError as ke:
+        print(f"[LOAD MODES] Missing key {ke} in {path}", file=sys.stderr)
+        return None
+
+
+def load_modes(directory: Path) -> ModeIndex:
+    with os.scandir(directory) as it:
+        entries = [entry for entry in it
+                   if entry.is_file() and entry.name.endswith((".yml", ".yaml"))]
+    cache_path = directory / _CACHE_NAME
+    key = _cache_key(entries)
+    cached = _load_cache(cache_path, key)
+    if cached is not None:
+        return ModeIndex.from_modes(cached)
+    modes: Dict[str, Mode] = {}
+    results: List[Optional[Mode]] = []
+    if entries:
+        # libyaml releases the GIL while parsing, so a small pool overlaps
+        # file reads and parse work across mode files.
+        with ThreadPoolExecutor(max_workers=min(8, len(entries))) as ex:
+            results = list(ex.map(_parse_one, [entry.path for entry in entries]))
+        for mode in results:
+            if mode is not None:
+                modes[mode.name] = mode
+    if None not in results:
+        # Don't cache partial results: a cached load would silently swallow
+        # the parse warnings on every later run.
+        _store_cache(cache_path, key, modes)
+    return ModeIndex.from_modes(modes)
+
+
+def match_barcode(index: ModeIndex, barcode: str) -> tuple[Optional[Mode], str, str]:
+    mode = index.trigger_index.get(barcode)
+    if mode is not None:
+        return mode, "trigger", ""
+    mode, prefix = _trie_lookup(index.prefix_root, barcode)
+    if mode is not None:
+        return mode, "prefix", prefix
+    return None, "", ""
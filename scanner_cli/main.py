@@ -32,10 +32,18 @@ Usage:
 from __future__ import annotations
 
 import argparse
+import atexit
+import functools
+import io
+import os
+import select
 import sys
 import json
 import logging
+import logging.handlers
+import queue
 import re
+import time
 from pathlib import Path
 import threading
 from typing import Dict
@@ -44,24 +52,29 @@ from rich.table import Table
 from rich.prompt import Prompt
 from rich import box
 
-from .config import load_modes, find_mode, Mode
+from .config import load_modes, match_barcode, Mode, ModeIndex
 from . import __version__
 from .client import ApiClient
 import ast
 
+try:
+    import orjson
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+    def _dumps_bytes(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:
+    def _dumps(obj) -> str:
+        return json.dumps(obj, ensure_ascii=False)
+
+    def _dumps_bytes(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode()
 
-def _eval_mathops(expr: str):
-    expr = expr.strip()
-    if not expr:
-        raise ValueError("empty expression")
-    if any(c in expr for c in "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_[]{};:\\'"):
-        raise ValueError("disallowed characters")
-    try:
-        tree = ast.parse(expr, mode="eval")
-    except SyntaxError as e:
-        raise ValueError("syntax error") from e
 
-    base_allowed = [
+_ALLOWED_NODES = tuple(
+    node for node in (
         ast.Expression,
         ast.BinOp,
         ast.UnaryOp,
@@ -76,22 +89,44 @@ def _eval_mathops(expr: str):
         ast.USub,
         ast.UAdd,
         ast.Load,
-    ]
-    if hasattr(ast, 'Paren'):
-        base_allowed.append(
-            ast.Paren)
-    allowed_nodes = tuple(base_allowed)
-
-    for node in ast.walk(tree):
-        if not isinstance(node, allowed_nodes):
+        getattr(ast, "Paren", None),
+    ) if node is not None
+)
+
+
+_BAD_RE = re.compile(r"[A-Za-z_\[\]{};:\\']")
+
+
+class _SafeChecker(ast.NodeVisitor):
+    def generic_visit(self, node):
+        if not isinstance(node, _ALLOWED_NODES):
             raise ValueError(f"disallowed node {type(node).__name__}")
-        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
-            if isinstance(node.value, int) and abs(node.value) > 10**12:
-                raise ValueError("integer too large")
-            if isinstance(node.value, float) and abs(node.value) > 10**12:
-                raise ValueError("float too large")
-    value = eval(compile(tree, filename="<expr>", mode="eval"),
-                 {"__builtins__": {}}, {})
+        super().generic_visit(node)
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, int) and abs(node.value) > 10**12:
+            raise ValueError("integer too large")
+        if isinstance(node.value, float) and abs(node.value) > 10**12:
+            raise ValueError("float too large")
+
+
+@functools.lru_cache(maxsize=512)
+def _compile_expr(expr: str):
+    try:
+        tree = ast.parse(expr, mode="eval")
+    except SyntaxError as e:
+        raise ValueError("syntax error") from e
+    _SafeChecker().visit(tree)
+    return compile(tree, filename="<expr>", mode="eval")
+
+
+def _eval_mathops(expr: str):
+    expr = expr.strip()
+    if not expr:
+        raise ValueError("empty expression")
+    if _BAD_RE.search(expr):
+        raise ValueError("disallowed characters")
+    value = eval(_compile_expr(expr), {"__builtins__": {}}, {})
     if isinstance(value, float) and value.is_integer():
         value = int(value)
     return value
@@ -99,16 +134,70 @@ def _eval_mathops(expr: str):
 
 console = Console()
 
+_TTY = console.is_terminal
+_MARKUP_RE = re.compile(r"\[/?[a-z][^\]]*\]")
+
+
+def _emit(msg: str, style: str | None = None):
+    if _TTY:
+        console.print(msg, style=style)
+    else:
+        print(_MARKUP_RE.sub("", msg))
 
-_ANSI_CSI_RE = re.compile(r"\x1B\[[0-?]*[ -/]*[@-~]")
+
+_ANSI_RE = re.compile(r"\x1B(?:\[[0-?]*[ -/]*[@-~])?")
 
 
 def sanitize_input(value: str) -> str:
-    if not value:
+    if not value or "\x1b" not in value:
         return value
-    cleaned = _ANSI_CSI_RE.sub("", value)
-    cleaned = cleaned.replace("\x1b", "")
-    return cleaned
+    return _ANSI_RE.sub("", value)
+
+
+def _scan_lines(stream):
+    for line in stream:
+        barcode = sanitize_input(line.strip())
+        if barcode:
+            yield barcode
+
+
+class _TimedLineReader:
+    # Reads the fd directly (no readahead buffer) so select() sees exactly
+    # the data we have not consumed yet. The scan loop and the input prompt
+    # must both read through this single buffer; a second reader on the same
+    # fd would steal bytes the other one blocks on.
+
+    def __init__(self, fd: int, get_timeout, on_timeout):
+        self._fd = fd
+        self._get_timeout = get_timeout
+        self._on_timeout = on_timeout
+        self._buf = bytearray()
+        self._eof = False
+
+    def readline(self) -> str | None:
+        buf = self._buf
+        while True:
+            nl = buf.find(b"\n")
+            if nl >= 0:
+                line = buf[:nl].decode("utf-8", "replace")
+                del buf[:nl + 1]
+                return line
+            if self._eof:
+                if buf:
+                    line = buf.decode("utf-8", "replace")
+                    buf.clear()
+                    return line
+                return None
+            readable, _, _ = select.select(
+                [self._fd], [], [], self._get_timeout())
+            if not readable:
+                self._on_timeout()
+                continue
+            chunk = os.read(self._fd, 65536)
+            if not chunk:
+                self._eof = True
+                continue
+            buf += chunk
 
 
 def parse_args(argv=None):
@@ -135,17 +224,27 @@ def configure_logging(log_file: str | None, verbosity: int):
         level = logging.INFO
     elif verbosity >= 2:
         level = logging.DEBUG
-    handlers: list[logging.Handler] = [logging.StreamHandler(sys.stderr)]
+    sinks: list[logging.Handler] = [logging.StreamHandler(sys.stderr)]
     if log_file:
         fh = logging.FileHandler(log_file, encoding="utf-8")
-        handlers.append(fh)
-    logging.basicConfig(level=level, handlers=handlers, format="%(message)s")
+        sinks.append(fh)
+    formatter = logging.Formatter("%(message)s")
+    for sink in sinks:
+        sink.setFormatter(formatter)
+    # The scan loop only enqueues records; a background listener thread does
+    # the formatting and I/O.
+    q: queue.SimpleQueue = queue.SimpleQueue()
+    logging.basicConfig(level=level, handlers=[
+                        logging.handlers.QueueHandler(q)], format="%(message)s")
+    listener = logging.handlers.QueueListener(q, *sinks)
+    listener.start()
+    atexit.register(listener.stop)
     logging.getLogger("httpx").setLevel(logging.WARNING)
 
 
 def log_event(event: str, **fields):
     record = {"event": event, **fields}
-    logging.getLogger(__name__).info(json.dumps(record, ensure_ascii=False))
+    logging.getLogger(__name__).info(_dumps(record))
 
 
 def list_modes(modes: Dict[str, Mode]):
@@ -170,7 +269,8 @@ def main(argv=None):
     if not modes_dir.exists():
         console.print(f"[red]Modes directory {modes_dir} does not exist[/red]")
         return 1
-    modes = load_modes(modes_dir)
+    index = load_modes(modes_dir)
+    modes = index.modes
     configure_logging(args.log_file, args.verbose)
     if args.list_modes:
         list_modes(modes)
@@ -184,6 +284,14 @@ def main(argv=None):
     current_mode = default_mode
     mode_lock = threading.Lock()
     idle_timer: threading.Timer | None = None
+    deadline: float | None = None
+    try:
+        stdin_fd: int | None = sys.stdin.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        stdin_fd = None
+    # select() on pipe/tty fds is POSIX-only; Windows keeps the Timer path.
+    use_select = bool(
+        args.idle_timeout) and stdin_fd is not None and sys.platform != "win32"
 
     def cancel_timer():
         nonlocal idle_timer
@@ -196,54 +304,80 @@ def main(argv=None):
         with mode_lock:
             if current_mode.name != default_mode.name:
                 current_mode = default_mode
-                console.print(
+                _emit(
                     f"[yellow]Mode auto-reverted to {default_mode.name} ({reason})[/yellow]")
                 log_event("mode_auto_revert",
                           to_mode=default_mode.name, reason=reason)
 
-    def schedule_timeout():
-        nonlocal idle_timer
-        if not args.idle_timeout:
-            return
-        if current_mode.name == default_mode.name:
+    if use_select:
+        def schedule_timeout():
+            nonlocal deadline
+            if current_mode.name == default_mode.name:
+                deadline = None
+            else:
+                deadline = time.monotonic() + args.idle_timeout
+    else:
+        def schedule_timeout():
+            nonlocal idle_timer
+            if not args.idle_timeout:
+                return
+            if current_mode.name == default_mode.name:
+                cancel_timer()
+                return
             cancel_timer()
-            return
-        cancel_timer()
-        idle_timer = threading.Timer(
-            args.idle_timeout, lambda: _do_timeout("inactivity"))
-        idle_timer.daemon = True
-        idle_timer.start()
+            idle_timer = threading.Timer(
+                args.idle_timeout, lambda: _do_timeout("inactivity"))
+            idle_timer.daemon = True
+            idle_timer.start()
     console.print(
         f"Starting in mode [bold]{current_mode.name}[/bold]. Ready for scans (Ctrl+C to exit)...")
     log_event("startup", current_mode=current_mode.name, modes=list(modes))
 
+    line_reader: _TimedLineReader | None = None
+    if use_select:
+        def _remaining():
+            return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+        def _on_idle():
+            nonlocal deadline
+            deadline = None
+            _do_timeout("inactivity")
+
+        line_reader = _TimedLineReader(stdin_fd, _remaining, _on_idle)
+        line_iter = iter(line_reader.readline, None)
+    else:
+        # Iterate sys.stdin itself: the C-level buffered iterator batches
+        # reads while input()/Prompt.ask keep sharing the same buffer.
+        line_iter = sys.stdin
+    scan_lines = _scan_lines(line_iter)
+    prompt_mode: str | None = None
+    prompt_str = ""
+
     with ApiClient() as api:
         while True:
             try:
+                if current_mode.name != prompt_mode:
+                    prompt_mode = current_mode.name
+                    prompt_str = f"[{prompt_mode}] "
+                sys.stdout.write(prompt_str)
+                sys.stdout.flush()
                 try:
-                    console.print("[", end="")
-                    console.print(current_mode.name, style="green", end="")
-                    console.print("] ", end="")
-                except Exception:
-                    pass
-                line = sys.stdin.readline()
-                if line == '':
+                    barcode = next(scan_lines)
+                except StopIteration:
                     log_event("stdin_eof")
                     break
-                barcode = sanitize_input(line.strip())
-                if not barcode:
-                    continue
 
-                triggered_mode = find_mode(modes, barcode)
+                triggered_mode, match_kind, matched_prefix = match_barcode(
+                    index, barcode)
                 effective_mode = current_mode
                 ephemeral = False
                 raw_barcode = barcode
                 if triggered_mode:
-                    if triggered_mode.trigger and barcode in triggered_mode.trigger:
+                    if match_kind == "trigger":
                         with mode_lock:
                             current_mode = triggered_mode
                             effective_mode = current_mode
-                        console.print(
+                        _emit(
                             f"Switched mode to [green]{current_mode.name}[/green]")
                         log_event(
                             "mode_switch", new_mode=current_mode.name, trigger=raw_barcode)
@@ -253,36 +387,30 @@ def main(argv=None):
                         payload = {
                             "barcode": raw_barcode, "mode": effective_mode.name, "action": "mode"}
                         try:
-                            resp = api.send(
-                                effective_mode.method,
-                                effective_mode.endpoint,
-                                payload,
-                                timeout=effective_mode.timeout,
-                                headers=effective_mode.header,
-                            )
+                            body = _dumps_bytes(
+                                payload) if effective_mode._use_json else None
+                            resp = api.send_prepared(
+                                effective_mode, payload, content=body)
                             if resp.is_success:
-                                console.print(
+                                _emit(
                                     f"[green]{effective_mode.method} {resp.status_code}[/green] -> {effective_mode.endpoint} {payload}")
                                 log_event("sent", mode=effective_mode.name, endpoint=effective_mode.endpoint,
                                           status=resp.status_code, method=effective_mode.method, payload=payload)
                             else:
-                                console.print(
+                                _emit(
                                     f"[red]{effective_mode.method} {resp.status_code}[/red] {payload}: {resp.text}")
                                 log_event("error", mode=effective_mode.name, endpoint=effective_mode.endpoint,
                                           status=resp.status_code, method=effective_mode.method, response=resp.text)
                         except Exception as e:
-                            console.print(f"[red]Request failed[/red]: {e}")
+                            _emit(f"[red]Request failed[/red]: {e}")
                             log_event("exception", mode=effective_mode.name,
                                       method=effective_mode.method, error=str(e))
                         continue
-                    if triggered_mode.prefix_trigger:
-                        for pref in triggered_mode.prefix_trigger:
-                            if barcode.startswith(pref):
-                                effective_mode = triggered_mode
-                                ephemeral = True
-                                if triggered_mode.strip_prefix:
-                                    barcode = barcode[len(pref):]
-                                break
+                    elif match_kind == "prefix":
+                        effective_mode = triggered_mode
+                        ephemeral = True
+                        if triggered_mode.strip_prefix:
+                            barcode = barcode[len(matched_prefix):]
 
                 payload = {"barcode": barcode,
                            "mode": effective_mode.name, "action": "scan"}
@@ -290,11 +418,16 @@ def main(argv=None):
                     payload["raw_barcode"] = raw_barcode
                 if effective_mode.enable_input:
                     base_prompt = ">>> INPUT"
-                    try:
-                        extra = Prompt.ask(
-                            base_prompt, default="", show_default=False) or ""
-                    except TypeError:
-                        extra = Prompt.ask(base_prompt, default="") or ""
+                    if line_reader is not None:
+                        sys.stdout.write(base_prompt + ": ")
+                        sys.stdout.flush()
+                        extra = (line_reader.readline() or "").strip()
+                    else:
+                        try:
+                            extra = Prompt.ask(
+                                base_prompt, default="", show_default=False) or ""
+                        except TypeError:
+                            extra = Prompt.ask(base_prompt, default="") or ""
                     if extra:
                         if effective_mode.eval_mathops:
                             try:
@@ -307,25 +440,22 @@ def main(argv=None):
                         payload["action"] = "scan+input"
 
                 try:
-                    resp = api.send(
-                        effective_mode.method,
-                        effective_mode.endpoint,
-                        payload,
-                        timeout=effective_mode.timeout,
-                        headers=effective_mode.header,
-                    )
+                    body = _dumps_bytes(
+                        payload) if effective_mode._use_json else None
+                    resp = api.send_prepared(
+                        effective_mode, payload, content=body)
                     if resp.is_success:
-                        console.print(
+                        _emit(
                             f"[green]{effective_mode.method} {resp.status_code}[/green] -> {effective_mode.endpoint} {payload}")
                         log_event("sent", mode=effective_mode.name, endpoint=effective_mode.endpoint,
                                   status=resp.status_code, method=effective_mode.method, payload=payload)
                     else:
-                        console.print(
+                        _emit(
                             f"[red]{effective_mode.method} {resp.status_code}[/red] {payload}: {resp.text}")
                         log_event("error", mode=effective_mode.name, endpoint=effective_mode.endpoint,
                                   status=resp.status_code, method=effective_mode.method, response=resp.text)
                 except Exception as e:
-                    console.print(f"[red]Request failed[/red]: {e}")
+                    _emit(f"[red]Request failed[/red]: {e}")
                     log_event("exception", mode=effective_mode.name,
                               method=effective_mode.method, error=str(e))
 
@@ -338,7 +468,7 @@ def main(argv=None):
                 log_event("shutdown", current_mode=current_mode.name)
                 break
             except Exception as e:
-                console.print(f"[red]Unexpected error[/red]: {e}")
+                _emit(f"[red]Unexpected error[/red]: {e}")
 
     cancel_timer()
     return 0